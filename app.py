@@ -3,74 +3,234 @@ Flask Web Interface
 Simple Flask app for the Semantic Movie Recommendation System.
 """
 
-from flask import Flask, render_template, jsonify, request
-from movie_ontology import create_ontology, load_ontology_from_file
+from functools import lru_cache
+from flask import Flask, Response, render_template, jsonify, request
+from flask.json.provider import JSONProvider
+from rdflib import RDF, RDFS
+from rdflib.plugins.sparql import prepareQuery
+from movie_ontology import EX, create_ontology, load_ontology_from_file, local_label
 from semantic_reasoner import apply_all_rules
-from queries import query_similar_movies, get_all_movies, query_movie_details, query_by_preferences
-from explanation_generator import generate_explanation, get_rdf_triples_for_movie
-from visualize import visualize_ontology_graph
+import movie_ontology
+import semantic_reasoner
+from queries import query_similar_movies, get_all_movies, query_movie_details, query_by_preferences, get_movie_feature_table
+from explanation_generator import generate_explanation, get_rdf_triples_for_movie, clear_caches
+from visualize import get_graph_data, clear_render_cache
+import gzip
+import hashlib
+import orjson
 import os
+import pickle
+import rdflib
+import sys
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, which serializes straight to bytes."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_SORT_KEYS),
+                                        mimetype='application/json')
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Inferred graphs are cached here, keyed by the inputs that produce them.
+# Set KNOWLEDGE_BASE_CACHE_DIR to move the cache, or to an empty string to disable it
+CACHE_DIR = os.environ.get('KNOWLEDGE_BASE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache'))
+
+def knowledge_base_key(data_file):
+    """
+    Hash the data file together with the schema and rule sources and the
+    Python and rdflib versions the graph is pickled with, so a cached graph
+    is only reused when neither the data, the inference nor the pickle
+    format changed.
+    
+    Args:
+        data_file: Path to the Turtle data file
+        
+    Returns:
+        Hex digest identifying the inferred graph
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{sys.version}|{rdflib.__version__}".encode())
+    for path in (data_file, movie_ontology.__file__, semantic_reasoner.__file__):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_knowledge_base(data_file):
+    """
+    Build the ontology, load the movie data and apply the inference rules,
+    reusing the inferred graph from CACHE_DIR when one exists for these inputs.
+    Caching is best effort: if the graph cannot be written, the app still
+    starts with the graph built in memory.
+    
+    Args:
+        data_file: Path to the Turtle data file
+        
+    Returns:
+        RDF Graph with inferred triples
+    """
+    # Results memoized against an earlier graph must not be served for this one
+    clear_caches()
+    clear_render_cache()
+    
+    if not os.path.exists(data_file):
+        print(f"Warning: {data_file} not found. Using empty ontology.")
+        return apply_all_rules(create_ontology())
+    
+    cache_path = os.path.join(CACHE_DIR, f"{knowledge_base_key(data_file)}.pickle") if CACHE_DIR else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                graph = pickle.load(f)
+            print(f"Loaded {len(graph)} inferred triples from {cache_path}")
+            return graph
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"Warning: could not load {cache_path} ({e}). Rebuilding.")
+    
+    graph = load_ontology_from_file(create_ontology(), data_file)
+    print(f"Loaded {len(graph)} triples from {data_file}")
+    graph = apply_all_rules(graph)
+    
+    if cache_path:
+        save_knowledge_base(graph, cache_path)
+    return graph
+
+def save_knowledge_base(graph, cache_path):
+    """
+    Write the inferred graph to cache_path and remove graphs cached for
+    earlier inputs. Failures are reported and otherwise ignored.
+    
+    Args:
+        graph: RDF Graph with inferred triples
+        cache_path: Path of the pickle in CACHE_DIR
+    """
+    # Write to a temporary name first so concurrent workers never read a partial file
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pickle.PicklingError) as e:
+        print(f"Warning: could not cache the knowledge base in {CACHE_DIR} ({e}).")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+    
+    # Graphs cached for earlier inputs can never be loaded again
+    try:
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith('.pickle') and name != os.path.basename(cache_path):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, name))
+                except FileNotFoundError:
+                    pass  # already pruned by another worker
+    except OSError as e:
+        print(f"Warning: could not prune old caches in {CACHE_DIR} ({e}).")
 
 # Initialize the knowledge base
 print("Loading movie ontology and data...")
-graph = create_ontology()
 data_file = os.path.join(os.path.dirname(__file__), 'data', 'movies_data.ttl')
-if os.path.exists(data_file):
-    graph = load_ontology_from_file(graph, data_file)
-    print(f"Loaded {len(graph)} triples from {data_file}")
-else:
-    print(f"Warning: {data_file} not found. Using empty ontology.")
+graph = load_knowledge_base(data_file)
+
+# Build the per-movie feature table once; request handlers only read it
+get_movie_feature_table(graph)
+
+# Genre options for /api/filters, parsed once
+GENRES_QUERY = prepareQuery("""
+    SELECT DISTINCT ?genre ?label
+    WHERE {
+        ?genre rdf:type ex:Genre .
+        ?genre rdfs:label ?label .
+    }
+    ORDER BY ?label
+    """, initNs={'ex': EX, 'rdf': RDF, 'rdfs': RDFS})
+
+# Rating range filters offered to the UI: (id, label, minimum rating)
+RATING_RANGES = [
+    ('any', 'Any Rating', None),
+    ('high', '8.0+ Excellent', 8.0),
+    ('good', '7.0+ Good', 7.0),
+    ('moderate', '6.0+ Moderate', 6.0)
+]
+MIN_RATING_BY_RANGE = {range_id: min_rating for range_id, _, min_rating in RATING_RANGES}
+
+def precompressed(payload):
+    """
+    Pair a serialized JSON payload with its gzip encoding, for responses
+    that are built once and served unchanged.
+    
+    Args:
+        payload: JSON bytes
+        
+    Returns:
+        Tuple (payload, gzip-compressed payload)
+    """
+    return payload, gzip.compress(payload, compresslevel=6)
+
+def static_json_response(payloads):
+    """Serve a precompressed() payload, gzip-encoded when the client accepts it."""
+    payload, compressed = payloads
+    if request.accept_encodings['gzip']:
+        response = Response(compressed, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
 
-# Apply inference rules
-graph = apply_all_rules(graph)
+@lru_cache(maxsize=2048)
+def movie_uri_for(movie_id):
+    """Full URI string for a movie id from a request path or body."""
+    return str(EX[movie_id])
 
 @app.route('/')
 def index():
     """Serve the main HTML interface."""
     return render_template('movie_recommender_ui.html')
 
-@app.route('/api/movies', methods=['GET'])
-def get_movies():
-    """Get all movies for the dropdown."""
+def list_movies():
+    """Build the movie list served by /api/movies."""
     movies = get_all_movies(graph)
     movies_list = []
     for uri, title, rating in movies:
-        uri_part = uri.split('#')[-1]
+        uri_part = local_label(uri)[0]
         movies_list.append({
             'id': uri_part,
             'uri': uri,
             'title': title,
             'rating': rating
         })
-    return jsonify(movies_list)
+    return movies_list
+
+@app.route('/api/movies', methods=['GET'])
+def get_movies():
+    """Get all movies for the dropdown."""
+    return static_json_response(MOVIES_JSON)
 
 @app.route('/api/movie/<movie_id>', methods=['GET'])
 def get_movie_details(movie_id):
     """Get detailed information about a specific movie."""
-    from movie_ontology import EX
-    movie_uri = EX[movie_id]
-    movie_uri_str = str(movie_uri)
-    
-    details = query_movie_details(graph, movie_uri_str)
+    details = query_movie_details(graph, movie_uri_for(movie_id))
     return jsonify(details)
 
 @app.route('/api/recommendations/<movie_id>/explanation', methods=['GET'])
 def get_recommendation_explanation(movie_id):
     """Get explanation for why a movie was recommended."""
-    from movie_ontology import EX
     target_movie_id = request.args.get('target_movie_id')
     
-    movie_uri = EX[movie_id]
-    movie_uri_str = str(movie_uri)
-    
-    target_movie_uri = None
-    if target_movie_id:
-        target_movie_uri = EX[target_movie_id]
-        target_movie_uri_str = str(target_movie_uri)
-    else:
-        target_movie_uri_str = None
+    movie_uri_str = movie_uri_for(movie_id)
+    target_movie_uri_str = movie_uri_for(target_movie_id) if target_movie_id else None
     
     explanation = generate_explanation(graph, movie_uri_str, target_movie_uri=target_movie_uri_str)
     rdf_triples = get_rdf_triples_for_movie(graph, movie_uri_str, limit=10)
@@ -91,16 +251,15 @@ def get_recommendations():
         return jsonify({'error': 'Movie ID is required'}), 400
     
     # Convert movie_id to full URI
-    from movie_ontology import EX
-    movie_uri = EX[movie_id]
-    movie_uri_str = str(movie_uri)
+    movie_uri_str = movie_uri_for(movie_id)
     
-    # Get similar movies
-    similar_movies = query_similar_movies(graph, movie_uri_str, limit=5)
+    # Get the 5 most similar movies and keep the 3 best rated; the displayed
+    # score below is monotone in rating, so this is the same ranking
+    similar_movies = query_similar_movies(graph, movie_uri_str, limit=5, top_n=3)
     
     recommendations = []
     for uri, title, rating in similar_movies:
-        uri_part = uri.split('#')[-1]
+        uri_part = local_label(uri)[0]
         explanation = generate_explanation(graph, uri, target_movie_uri=movie_uri_str)
         rdf_triples = get_rdf_triples_for_movie(graph, uri, limit=5)
         
@@ -117,54 +276,33 @@ def get_recommendations():
             'rdf_triples': rdf_triples
         })
     
-    # Sort by similarity score
-    recommendations.sort(key=lambda x: x['similarity_score'], reverse=True)
-    
     return jsonify({
-        'recommendations': recommendations[:3]  # Return top 3
+        'recommendations': recommendations
     })
 
-@app.route('/api/filters', methods=['GET'])
-def get_filters():
-    """Get available filter options (genres, rating ranges)."""
-    from movie_ontology import EX
-    from rdflib import RDF, RDFS
-    
+def list_filters():
+    """Build the filter options served by /api/filters."""
     # Get all genres
-    genres_query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    
-    SELECT DISTINCT ?genre ?label
-    WHERE {
-        ?genre rdf:type ex:Genre .
-        ?genre rdfs:label ?label .
-    }
-    ORDER BY ?label
-    """
-    
     genres = []
-    for row in graph.query(genres_query):
-        genre_uri = str(row.genre)
-        genre_id = genre_uri.split('#')[-1].replace('genre_', '').replace('_', ' ')
+    for row in graph.query(GENRES_QUERY):
+        genre_id = local_label(row.genre)[1]
         genres.append({
             'id': genre_id,
             'label': str(row.label)
         })
     
     # Rating ranges
-    rating_ranges = [
-        {'id': 'any', 'label': 'Any Rating'},
-        {'id': 'high', 'label': '8.0+ Excellent'},
-        {'id': 'good', 'label': '7.0+ Good'},
-        {'id': 'moderate', 'label': '6.0+ Moderate'}
-    ]
+    rating_ranges = [{'id': range_id, 'label': label} for range_id, label, _ in RATING_RANGES]
     
-    return jsonify({
+    return {
         'genres': genres,
         'rating_ranges': rating_ranges
-    })
+    }
+
+@app.route('/api/filters', methods=['GET'])
+def get_filters():
+    """Get available filter options (genres, rating ranges)."""
+    return static_json_response(FILTERS_JSON)
 
 @app.route('/api/recommendations/preferences', methods=['POST'])
 def get_recommendations_by_preferences():
@@ -180,27 +318,23 @@ def get_recommendations_by_preferences():
         genre_normalized = genre.replace(' ', '_')
         preferences['genres'] = [genre_normalized]
     
-    if rating_range == 'high':
-        preferences['min_rating'] = 8.0
-    elif rating_range == 'good':
-        preferences['min_rating'] = 7.0
-    elif rating_range == 'moderate':
-        preferences['min_rating'] = 6.0
+    min_rating = MIN_RATING_BY_RANGE.get(rating_range)
+    if min_rating is not None:
+        preferences['min_rating'] = min_rating
     
     # Get movies matching preferences
     movies = query_by_preferences(graph, preferences, limit=10)
     
     recommendations = []
     for uri, title, rating in movies:
-        uri_part = uri.split('#')[-1]
+        uri_part = local_label(uri)[0]
         details = query_movie_details(graph, uri)
         
         # Extract genres and director for tags
         tags = []
         if details.get('genres'):
-            # Get unique genres (already formatted strings)
-            unique_genres = list(set(details['genres']))[:2]
-            tags.extend([{'type': 'genre', 'label': g.title()} for g in unique_genres])
+            # Genres are already distinct, formatted strings
+            tags.extend([{'type': 'genre', 'label': g.title()} for g in details['genres'][:2]])
         if details.get('directors'):
             director_name = details['directors'][0]  # Already formatted
             tags.append({'type': 'director', 'label': director_name})
@@ -227,31 +361,58 @@ def get_recommendations_by_preferences():
             'director': details.get('directors', [None])[0],
             'description': f"{title} is a {genre_name} film{director_text}.",
             'tags': tags,
-            'genres': list(set(details.get('genres', []))),
-            'actors': list(set(details.get('actors', [])))[:3]
+            'genres': details['genres'],
+            'actors': details['actors'][:3]
         })
     
     return jsonify({
         'recommendations': recommendations
     })
 
+# Visualization nodes, edges and options, serialized on the first /api/graph request
+_GRAPH_JSON = None
+
 @app.route('/graph')
 def view_graph():
-    """Serve the knowledge graph visualization."""
-    # Generate visualization HTML showing ontology structure
-    html_file = visualize_ontology_graph(graph, max_movies=5)
+    """Serve the knowledge graph visualization page; it loads its data from /api/graph."""
+    return render_template('graph.html')
+
+@app.route('/api/graph', methods=['GET'])
+def get_graph():
+    """Get the nodes, edges and options drawn by the /graph page."""
+    global _GRAPH_JSON
     
-    # Read and return the HTML content
-    with open(html_file, 'r', encoding='utf-8') as f:
-        html_content = f.read()
+    # Built once, and again after refresh_caches()
+    if _GRAPH_JSON is None:
+        _GRAPH_JSON = precompressed(jsonify(get_graph_data(graph, max_movies=5)).get_data())
     
-    # Clean up the temporary file
-    try:
-        os.remove(html_file)
-    except:
-        pass
+    return static_json_response(_GRAPH_JSON)
+
+def build_responses():
+    """
+    Serialize (and compress) the movie list and filter options, which are
+    served as-is until the graph changes.
+    """
+    global MOVIES_JSON, FILTERS_JSON, _GRAPH_JSON
     
-    return html_content
+    with app.app_context():
+        MOVIES_JSON = precompressed(jsonify(list_movies()).get_data())
+        FILTERS_JSON = precompressed(jsonify(list_filters()).get_data())
+    _GRAPH_JSON = None
+
+def refresh_caches():
+    """
+    Drop everything memoized against the graph (query results, explanations,
+    feature tables and visualizations) and rebuild the precomputed responses.
+    Must be called after modifying the graph, e.g. with bulk_add_movies
+    followed by apply_all_rules.
+    """
+    clear_caches()
+    clear_render_cache()
+    get_movie_feature_table(graph)
+    build_responses()
+
+build_responses()
 
 if __name__ == '__main__':
     # Ensure templates directory exists
@@ -3,13 +3,33 @@ Explanation Generator Module
 Generates human-readable explanations for movie recommendations based on RDF reasoning.
 """
 
+from functools import lru_cache
 from rdflib import Graph, RDF
-from movie_ontology import EX
+from movie_ontology import EX, local_label, instance_uri
+from queries import query_movie_features, get_movie_feature_table, freeze_preferences, clear_query_cache
+
+# Predicate URIs as they appear in explanation triples
+_P_DIRECTEDBY_STR = str(EX.directedBy)
+_P_HASGENRE_STR = str(EX.hasGenre)
+_P_HASSIMILARITY_STR = str(EX.hasSimilarity)
+
+# Properties shown by get_rdf_triples_for_movie: (feature key, display label)
+_PROP_ITER = (
+    ('genres', 'Genre'),
+    ('actors', 'Actor'),
+    ('directors', 'directed by'),
+    ('rating', 'Rating'),
+    ('moods', 'Mood'),
+    ('languages', 'Language')
+)
 
 def generate_explanation(graph, movie_uri, target_movie_uri=None, preferences=None):
     """
     Generate explanation for why a movie was recommended.
     
+    Results are memoized per (movie, target, preferences); the returned
+    dictionary is shared between callers and must not be mutated.
+    
     Args:
         graph: RDF Graph containing movie data
         movie_uri: URI of the recommended movie (string or URIRef)
@@ -19,13 +39,26 @@ def generate_explanation(graph, movie_uri, target_movie_uri=None, preferences=No
     Returns:
         Dictionary with explanation details
     """
+    target_key = str(target_movie_uri) if target_movie_uri else None
+    return _cached_explanation(graph, str(movie_uri), target_key, freeze_preferences(preferences))
+
+def _features_for(graph, movie_key):
+    """Look up a movie's attributes, falling back to the graph for non-catalog URIs."""
+    features = get_movie_feature_table(graph).get(movie_key)
+    if features is None:
+        features = query_movie_features(graph, [movie_key])[movie_key]
+    return features
+
+@lru_cache(maxsize=4096)
+def _cached_explanation(graph, movie_key, target_key, prefs_key):
+    """Build the explanation for generate_explanation on a cache miss."""
     from rdflib import URIRef
     
-    # Convert string URIs to URIRef if needed
-    if isinstance(movie_uri, str):
-        movie_uri = URIRef(movie_uri)
-    if target_movie_uri and isinstance(target_movie_uri, str):
-        target_movie_uri = URIRef(target_movie_uri)
+    movie_uri = URIRef(movie_key)
+    target_movie_uri = URIRef(target_key) if target_key else None
+    preferences = dict(prefs_key) if prefs_key else None
+    
+    movie = _features_for(graph, movie_key)
     
     explanation = {
         'reasons': [],
@@ -33,73 +66,59 @@ def generate_explanation(graph, movie_uri, target_movie_uri=None, preferences=No
         'similarity_score': None
     }
     
-    # Get movie details
-    movie_title = None
-    for title in graph.objects(movie_uri, None):
-        if hasattr(title, 'value'):
-            movie_title = str(title)
-            break
-    
-    if not movie_title:
-        movie_title = str(movie_uri).split('#')[-1].replace('m_', '').replace('_', ' ')
-    
     # Explanation based on target movie similarity
     if target_movie_uri:
+        target = _features_for(graph, target_key)
+        
         # Check for same director
-        target_directors = list(graph.objects(target_movie_uri, EX.directedBy))
-        movie_directors = list(graph.objects(movie_uri, EX.directedBy))
-        common_directors = set(target_directors) & set(movie_directors)
+        common_directors = set(target['directors']) & set(movie['directors'])
         
         if common_directors:
-            director_name = str(common_directors.pop()).split('#')[-1].replace('director_', '').replace('_', ' ')
+            director_uri = next(iter(common_directors))
+            director_name = local_label(director_uri)[1]
             explanation['reasons'].append(f"Same director: {director_name}")
             explanation['rdf_triples'].append({
                 'subject': str(target_movie_uri),
-                'predicate': str(EX.directedBy),
-                'object': str(common_directors.pop() if common_directors else '')
+                'predicate': _P_DIRECTEDBY_STR,
+                'object': str(director_uri)
             })
         
         # Check for shared genres
-        target_genres = set(graph.objects(target_movie_uri, EX.hasGenre))
-        movie_genres = set(graph.objects(movie_uri, EX.hasGenre))
-        common_genres = target_genres & movie_genres
+        common_genres = set(target['genres']) & set(movie['genres'])
         
         if common_genres:
-            genre_names = [str(g).split('#')[-1].replace('genre_', '').replace('_', ' ') for g in common_genres]
+            genre_names = [local_label(g)[1] for g in common_genres]
             explanation['reasons'].append(f"Shared genres: {', '.join(genre_names)}")
             for genre in common_genres:
                 explanation['rdf_triples'].append({
                     'subject': str(movie_uri),
-                    'predicate': str(EX.hasGenre),
+                    'predicate': _P_HASGENRE_STR,
                     'object': str(genre)
                 })
         
-        # Check for direct similarity relationship
-        if (movie_uri, EX.hasSimilarity, target_movie_uri) in graph or \
-           (target_movie_uri, EX.hasSimilarity, movie_uri) in graph:
+        # Check for direct similarity relationship (symmetric, see infer_similar_movies)
+        if target_movie_uri in movie['similar']:
             explanation['reasons'].append("Semantically similar (inferred by reasoning engine)")
             explanation['rdf_triples'].append({
                 'subject': str(target_movie_uri),
-                'predicate': str(EX.hasSimilarity),
+                'predicate': _P_HASSIMILARITY_STR,
                 'object': str(movie_uri)
             })
         
         # Check for shared actors
-        target_actors = set(graph.objects(target_movie_uri, EX.hasActor))
-        movie_actors = set(graph.objects(movie_uri, EX.hasActor))
-        common_actors = target_actors & movie_actors
+        common_actors = set(target['actors']) & set(movie['actors'])
         
         if common_actors:
-            actor_names = [str(a).split('#')[-1].replace('actor_', '').replace('_', ' ') for a in list(common_actors)[:2]]
+            actor_names = [local_label(a)[1] for a in list(common_actors)[:2]]
             explanation['reasons'].append(f"Shared actors: {', '.join(actor_names)}")
     
     # Explanation based on user preferences
     if preferences:
         if preferences.get('genres'):
-            movie_genres = set(graph.objects(movie_uri, EX.hasGenre))
+            movie_genres = set(movie['genres'])
             matched_genres = []
             for pref_genre in preferences['genres']:
-                pref_genre_uri = EX[f"genre_{pref_genre.replace(' ', '_')}"]
+                pref_genre_uri = instance_uri('genre', pref_genre)
                 if pref_genre_uri in movie_genres:
                     matched_genres.append(pref_genre)
             
@@ -107,31 +126,26 @@ def generate_explanation(graph, movie_uri, target_movie_uri=None, preferences=No
                 explanation['reasons'].append(f"Matches requested genre(s): {', '.join(matched_genres)}")
         
         if preferences.get('director'):
-            movie_directors = list(graph.objects(movie_uri, EX.directedBy))
-            director_uri = EX[f"director_{preferences['director'].replace(' ', '_')}"]
-            if director_uri in movie_directors:
+            director_uri = instance_uri('director', preferences['director'])
+            if director_uri in movie['directors']:
                 explanation['reasons'].append(f"Directed by {preferences['director']}")
         
-        if preferences.get('min_rating'):
-            ratings = list(graph.objects(movie_uri, EX.hasRating))
-            if ratings and float(ratings[0]) >= preferences['min_rating']:
-                explanation['reasons'].append(f"Rating {float(ratings[0])} meets minimum threshold of {preferences['min_rating']}")
+        if preferences.get('min_rating') is not None:
+            if movie['rating'] is not None and movie['rating'] >= preferences['min_rating']:
+                explanation['reasons'].append(f"Rating {movie['rating']} meets minimum threshold of {preferences['min_rating']}")
         
         if preferences.get('mood'):
-            movie_moods = set(graph.objects(movie_uri, EX.hasMood))
-            mood_uri = EX[f"mood_{preferences['mood'].replace(' ', '_')}"]
-            if mood_uri in movie_moods:
+            mood_uri = instance_uri('mood', preferences['mood'])
+            if mood_uri in movie['moods']:
                 explanation['reasons'].append(f"Matches requested mood: {preferences['mood']}")
         
         if preferences.get('year'):
-            years = list(graph.objects(movie_uri, EX.releasedIn))
-            if years and int(years[0]) == preferences['year']:
+            if movie['year'] == preferences['year']:
                 explanation['reasons'].append(f"Released in {preferences['year']}")
     
     # Get rating for similarity score calculation
-    ratings = list(graph.objects(movie_uri, EX.hasRating))
-    if ratings:
-        rating_val = float(ratings[0])
+    if movie['rating'] is not None:
+        rating_val = movie['rating']
         explanation['similarity_score'] = rating_val / 10.0  # Normalize to 0-1
         if not explanation['reasons']:
             explanation['reasons'].append(f"High rating: {rating_val}")
@@ -163,6 +177,9 @@ def get_rdf_triples_for_movie(graph, movie_uri, limit=10):
     """
     Get relevant RDF triples for a movie to show reasoning path.
     
+    Results are memoized per (movie, limit); the returned list is shared
+    between callers and must not be mutated.
+    
     Args:
         graph: RDF Graph containing movie data
         movie_uri: URI of the movie (string or URIRef)
@@ -171,35 +188,49 @@ def get_rdf_triples_for_movie(graph, movie_uri, limit=10):
     Returns:
         List of triple dictionaries
     """
+    return _cached_rdf_triples(graph, str(movie_uri), limit)
+
+@lru_cache(maxsize=4096)
+def _cached_rdf_triples(graph, movie_key, limit):
+    """Collect the triples for get_rdf_triples_for_movie on a cache miss."""
     from rdflib import URIRef
     
-    # Convert string URI to URIRef if needed
-    if isinstance(movie_uri, str):
-        movie_uri = URIRef(movie_uri)
+    movie_uri = URIRef(movie_key)
+    movie = _features_for(graph, movie_key)
     
     triples = []
+    subject = local_label(movie_uri)[0].removeprefix('m_')
     
     # Get direct properties
-    for prop in [EX.hasGenre, EX.hasActor, EX.directedBy, EX.hasRating, EX.hasMood, EX.hasLanguage]:
-        for obj in graph.objects(movie_uri, prop):
-            prop_name = str(prop).split('#')[-1].replace('has', '').replace('directedBy', 'directed by').replace('_', ' ')
-            obj_name = str(obj).split('#')[-1].replace('m_', '').replace('actor_', '').replace('director_', '').replace('genre_', '').replace('mood_', '').replace('lang_', '').replace('_', ' ')
+    for key, prop_name in _PROP_ITER:
+        values = movie[key]
+        if key == 'rating':
+            values = [] if values is None else [values]
+        for obj in values:
             triples.append({
-                'subject': str(movie_uri).split('#')[-1].replace('m_', ''),
+                'subject': subject,
                 'predicate': prop_name,
-                'object': obj_name,
+                'object': local_label(obj)[1],
                 'type': 'property'
             })
     
     # Get similarity relationships
-    for similar in graph.objects(movie_uri, EX.hasSimilarity):
-        similar_name = str(similar).split('#')[-1].replace('m_', '').replace('_', ' ')
+    for similar in movie['similar']:
         triples.append({
-            'subject': str(movie_uri).split('#')[-1].replace('m_', ''),
+            'subject': subject,
             'predicate': 'similar to',
-            'object': similar_name,
+            'object': local_label(similar)[1],
             'type': 'similarity'
         })
     
     return triples[:limit]
 
+def clear_caches():
+    """
+    Drop memoized explanations, triples, query results and the movie
+    feature tables. The web app's app.refresh_caches() calls this along
+    with visualize.clear_render_cache() after the graph is modified.
+    """
+    _cached_explanation.cache_clear()
+    _cached_rdf_triples.cache_clear()
+    clear_query_cache()
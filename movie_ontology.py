@@ -3,10 +3,16 @@ Movie Ontology Design Module
 Defines RDF classes and properties for the movie recommendation system.
 """
 
+import re
+from decimal import Decimal
+from functools import lru_cache
 from rdflib import Graph, Namespace, RDF, RDFS, Literal, XSD
 
 EX = Namespace("http://example.org/movie#")
 
+# Type prefixes of instance local names (m_inception, actor_Tom_Hanks, ...)
+_PREFIX_RE = re.compile(r'^(?:m_|actor_|director_|genre_|mood_|lang_)')
+
 def create_ontology():
     """
     Creates and returns an RDF graph with the movie ontology schema.
@@ -59,3 +65,98 @@ def load_ontology_from_file(graph, filepath):
     graph.parse(filepath, format="turtle")
     return graph
 
+# Movie list fields accepted by bulk_add_movies: (key, predicate, class, URI prefix)
+_MOVIE_LINKS = (
+    ('genres', EX.hasGenre, EX.Genre, 'genre'),
+    ('actors', EX.hasActor, EX.Actor, 'actor'),
+    ('directors', EX.directedBy, EX.Director, 'director'),
+    ('languages', EX.hasLanguage, EX.Language, 'lang'),
+    ('moods', EX.hasMood, EX.Mood, 'mood')
+)
+
+def bulk_add_movies(graph, movies):
+    """
+    Add several movies, and the people, genres, languages and moods they
+    link to, in a single graph.addN call.
+    Run apply_all_rules afterwards, then app.refresh_caches() in the web
+    app (or explanation_generator.clear_caches() and
+    visualize.clear_render_cache()), so inferred facts, cached results and
+    the served responses reflect the new movies.
+    
+    Args:
+        graph: RDF Graph object
+        movies: Iterable of dictionaries with 'id' (e.g. 'inception'), 'title',
+            and optionally 'rating', 'year' and lists of display names under
+            'genres', 'actors', 'directors', 'languages' and 'moods'
+        
+    Returns:
+        Graph with the movies added
+        
+    Raises:
+        ValueError: If a rating is not a finite number
+        TypeError: If a genres/actors/... value is not a list or tuple
+    """
+    quads = []
+    for movie in movies:
+        movie_uri = EX[f"m_{movie['id']}"]
+        quads.append((movie_uri, RDF.type, EX.Movie, graph))
+        quads.append((movie_uri, RDFS.label, Literal(movie['title']), graph))
+        if movie.get('rating') is not None:
+            quads.append((movie_uri, EX.hasRating, Literal(_decimal_rating(movie['rating'])), graph))
+        if movie.get('year') is not None:
+            quads.append((movie_uri, EX.releasedIn, Literal(int(movie['year'])), graph))
+        
+        for key, predicate, cls, kind in _MOVIE_LINKS:
+            names = movie.get(key, ())
+            if not isinstance(names, (list, tuple)):
+                # A bare string would otherwise add one instance per character
+                raise TypeError(f"{key} of movie {movie['id']!r} must be a list, not {type(names).__name__}")
+            for name in names:
+                uri = instance_uri(kind, name)
+                quads.append((movie_uri, predicate, uri, graph))
+                quads.append((uri, RDF.type, cls, graph))
+                quads.append((uri, RDFS.label, Literal(name), graph))
+    
+    graph.addN(quads)
+    return graph
+
+def _decimal_rating(rating):
+    """Convert a rating to a Decimal, so it serializes as a valid xsd:decimal (no exponent)."""
+    try:
+        value = Decimal(str(rating))
+    except ArithmeticError:
+        value = None
+    if value is None or not value.is_finite():
+        raise ValueError(f"rating must be a finite number, not {rating!r}")
+    return value
+
+def local_label(uri):
+    """
+    Split an instance URI into its local name and a display name.
+    
+    Args:
+        uri: Instance URI (string or URIRef), e.g. ex:actor_Tom_Hanks
+        
+    Returns:
+        Tuple (local_name, display_name), e.g. ('actor_Tom_Hanks', 'Tom Hanks')
+    """
+    return _split_uri(str(uri))
+
+@lru_cache(maxsize=8192)
+def _split_uri(uri):
+    local_name = uri.rpartition('#')[2]
+    return local_name, _PREFIX_RE.sub('', local_name).replace('_', ' ')
+
+@lru_cache(maxsize=8192)
+def instance_uri(kind, name):
+    """
+    Build the URI of a named instance; the inverse of local_label.
+    
+    Args:
+        kind: Local name prefix without the underscore, e.g. 'genre'
+        name: Display name, e.g. 'Science Fiction'
+        
+    Returns:
+        URIRef, e.g. ex:genre_Science_Fiction
+    """
+    return EX[f"{kind}_{name.replace(' ', '_')}"]
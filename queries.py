@@ -1,63 +1,68 @@
 """
 Query Processor Module
-Contains all SPARQL queries for movie recommendations and filtering.
+Contains all queries for movie recommendations and filtering.
+Queries are answered from tables built once per graph instead of through
+SPARQL: the movie feature table (get_movie_feature_table), the rating-ordered
+catalog (get_movie_catalog) and the inverse (feature, value) index
+(get_movie_index). Only query_movie_features, which builds the feature
+table, and query_movie_details look a movie's triples up directly.
+
+Query results are memoized per graph and arguments and shared between
+callers, so they must not be mutated; call clear_query_cache() after
+changing the graph.
 """
 
-from rdflib import Graph, Namespace, RDF, RDFS, Literal
-from movie_ontology import EX
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import lru_cache
+import heapq
+from rdflib import Graph, Namespace, RDF, RDFS, Literal, URIRef
+from movie_ontology import EX, instance_uri, local_label
 
-def query_similar_movies(graph, movie_uri, limit=5):
+@lru_cache(maxsize=256)
+def query_similar_movies(graph, movie_uri, limit=5, top_n=None):
     """
     Find movies similar to the given movie based on shared director and genres.
-    Uses direct graph traversal to avoid SPARQL parsing issues.
+    Reads the precomputed movie feature table instead of traversing the graph.
     
     Args:
         graph: RDF Graph containing movie data
         movie_uri: URI of the target movie (as string)
-        limit: Maximum number of results
+        limit: Maximum number of similar movies to consider
+        top_n: If given, return only the top_n of those, re-ranked by rating
         
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    from rdflib import URIRef, RDF, RDFS
-    
-    target_uri = URIRef(movie_uri)
+    features = get_movie_feature_table(graph)
     similar_movies = {}
     
     # Get target movie's director and genres
-    target_directors = list(graph.objects(target_uri, EX.directedBy))
-    target_genres = list(graph.objects(target_uri, EX.hasGenre))
+    target = features.get(movie_uri)
+    target_directors = set(target['directors']) if target else set()
+    target_genres = set(target['genres']) if target else set()
     
     # Find movies with same director or shared genres
-    for movie_uri_obj in graph.subjects(RDF.type, EX.Movie):
-        movie_uri_str = str(movie_uri_obj)
-        
+    for movie_uri_str, movie in features.items():
         # Skip the target movie itself
         if movie_uri_str == movie_uri:
             continue
         
         # Get movie details
-        titles = list(graph.objects(movie_uri_obj, RDFS.label))
-        if not titles:
+        if movie['title'] is None:
             continue
-        title = str(titles[0])
-        
-        ratings = list(graph.objects(movie_uri_obj, EX.hasRating))
-        rating = float(ratings[0]) if ratings else 0.0
-        
-        # Check for similarity
-        movie_directors = list(graph.objects(movie_uri_obj, EX.directedBy))
-        movie_genres = list(graph.objects(movie_uri_obj, EX.hasGenre))
+        title = movie['title']
+        rating = movie['rating'] if movie['rating'] is not None else 0.0
         
         # Calculate similarity score
         similarity_score = 0.0
         
         # Same director = high similarity
-        if any(d in target_directors for d in movie_directors):
+        if not target_directors.isdisjoint(movie['directors']):
             similarity_score += 0.5
         
         # Shared genres = medium similarity
-        shared_genres = set(target_genres) & set(movie_genres)
+        shared_genres = target_genres.intersection(movie['genres'])
         if shared_genres:
             similarity_score += len(shared_genres) * 0.2
         
@@ -67,12 +72,40 @@ def query_similar_movies(graph, movie_uri, limit=5):
         if similarity_score > 0:
             similar_movies[movie_uri_str] = (movie_uri_str, title, rating, similarity_score)
     
-    # Sort by similarity score and rating
-    result = sorted(similar_movies.values(), key=lambda x: (x[3], x[2]), reverse=True)
+    # Keep the best by similarity score and rating, without sorting every candidate
+    result = heapq.nlargest(limit, similar_movies.values(), key=lambda x: (x[3], x[2]))
+    
+    # Re-rank the shortlist by rating (nlargest is stable, so ties keep similarity order)
+    if top_n is not None:
+        result = heapq.nlargest(top_n, result, key=lambda x: x[2])
     
     # Return top results (without similarity score)
-    return [(uri, title, rating) for uri, title, rating, _ in result[:limit]]
+    return [(uri, title, rating) for uri, title, rating, _ in result]
+
+def _rank_movies(graph, movies=None, min_rating=None):
+    """
+    Pick candidate movies from the catalog, best rated first.
+    Candidates that are not in the catalog, or lack a rating, are skipped.
+    
+    Args:
+        graph: RDF Graph containing movie data
+        movies: Iterable of movie URIs (strings or URIRefs), or None for all movies
+        min_rating: Optional minimum rating
+        
+    Returns:
+        List of tuples (movie_uri, title, rating)
+    """
+    wanted = None if movies is None else set(map(str, movies))
+    rows = []
+    for uri, title, rating, _ in get_movie_catalog(graph):
+        if rating is None or (wanted is not None and uri not in wanted):
+            continue
+        if min_rating is not None and rating < min_rating:
+            continue
+        rows.append((uri, title, rating))
+    return rows
 
+@lru_cache(maxsize=256)
 def query_by_genre(graph, genre, limit=10):
     """
     Find movies by genre.
@@ -85,27 +118,11 @@ def query_by_genre(graph, genre, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    genre_uri = EX[f"genre_{genre.replace(' ', '_')}"]
+    genre_uri = instance_uri('genre', genre)
     
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    
-    SELECT ?movie ?title ?rating
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        ?movie ex:hasGenre <%s> .
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (genre_uri, limit)
-    
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating)) for row in results]
+    return _rank_movies(graph, get_movie_index(graph).get(('genres', genre_uri), ()))[:limit]
 
+@lru_cache(maxsize=256)
 def query_by_rating(graph, min_rating=8.0, limit=10):
     """
     Find movies with rating >= min_rating.
@@ -118,26 +135,9 @@ def query_by_rating(graph, min_rating=8.0, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    
-    SELECT ?movie ?title ?rating
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        FILTER(?rating >= %f)
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (min_rating, limit)
-    
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating)) for row in results]
+    return _rank_movies(graph, min_rating=min_rating)[:limit]
 
+@lru_cache(maxsize=256)
 def query_by_actor(graph, actor_name, limit=10):
     """
     Find movies featuring a specific actor.
@@ -150,27 +150,11 @@ def query_by_actor(graph, actor_name, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    actor_uri = EX[f"actor_{actor_name.replace(' ', '_')}"]
-    
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    actor_uri = instance_uri('actor', actor_name)
     
-    SELECT ?movie ?title ?rating
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        ?movie ex:hasActor <%s> .
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (actor_uri, limit)
-    
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating)) for row in results]
+    return _rank_movies(graph, get_movie_index(graph).get(('actors', actor_uri), ()))[:limit]
 
+@lru_cache(maxsize=256)
 def query_by_director(graph, director_name, limit=10):
     """
     Find movies directed by a specific director.
@@ -183,27 +167,11 @@ def query_by_director(graph, director_name, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    director_uri = EX[f"director_{director_name.replace(' ', '_')}"]
-    
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    director_uri = instance_uri('director', director_name)
     
-    SELECT ?movie ?title ?rating
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        ?movie ex:directedBy <%s> .
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (director_uri, limit)
-    
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating)) for row in results]
+    return _rank_movies(graph, get_movie_index(graph).get(('directors', director_uri), ()))[:limit]
 
+@lru_cache(maxsize=256)
 def query_by_year_range(graph, start_year, end_year, limit=10):
     """
     Find movies released in a year range.
@@ -217,26 +185,13 @@ def query_by_year_range(graph, start_year, end_year, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating, year)
     """
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    
-    SELECT ?movie ?title ?rating ?year
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        ?movie ex:releasedIn ?year .
-        FILTER(?year >= %d && ?year <= %d)
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (start_year, end_year, limit)
+    start_year, end_year = int(start_year), int(end_year)
     
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating), int(row.year)) for row in results]
+    return [(uri, title, rating, year)
+            for uri, title, rating, year in get_movie_catalog(graph)
+            if rating is not None and year is not None and start_year <= year <= end_year][:limit]
 
+@lru_cache(maxsize=256)
 def query_high_rated_by_genre(graph, genre, min_rating=8.0, limit=5):
     """
     Find high-rated movies in a specific genre.
@@ -250,29 +205,19 @@ def query_high_rated_by_genre(graph, genre, min_rating=8.0, limit=5):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    genre_uri = EX[f"genre_{genre.replace(' ', '_')}"]
-    
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-    
-    SELECT ?movie ?title ?rating
-    WHERE {
-        ?movie rdf:type ex:Movie .
-        ?movie rdfs:label ?title .
-        ?movie ex:hasRating ?rating .
-        ?movie ex:hasGenre <%s> .
-        FILTER(?rating >= %f)
-    }
-    ORDER BY DESC(?rating)
-    LIMIT %d
-    """ % (genre_uri, min_rating, limit)
+    genre_uri = instance_uri('genre', genre)
     
-    results = graph.query(query)
-    return [(str(row.movie), str(row.title), float(row.rating)) for row in results]
+    return _rank_movies(graph, get_movie_index(graph).get(('genres', genre_uri), ()), min_rating)[:limit]
+
+# List-valued details returned by query_movie_details: (details key, predicate)
+_DETAIL_LISTS = (
+    ('directors', EX.directedBy),
+    ('actors', EX.hasActor),
+    ('genres', EX.hasGenre),
+    ('languages', EX.hasLanguage)
+)
 
+@lru_cache(maxsize=256)
 def query_movie_details(graph, movie_uri):
     """
     Get complete details for a movie.
@@ -282,26 +227,10 @@ def query_movie_details(graph, movie_uri):
         movie_uri: URI of the movie
         
     Returns:
-        Dictionary with movie details
-    """
-    query = """
-    PREFIX ex: <http://example.org/movie#>
-    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    
-    SELECT ?title ?rating ?year ?director ?actor ?genre ?language
-    WHERE {
-        <%s> rdfs:label ?title .
-        OPTIONAL { <%s> ex:hasRating ?rating . }
-        OPTIONAL { <%s> ex:releasedIn ?year . }
-        OPTIONAL { <%s> ex:directedBy ?director . }
-        OPTIONAL { <%s> ex:hasActor ?actor . }
-        OPTIONAL { <%s> ex:hasGenre ?genre . }
-        OPTIONAL { <%s> ex:hasLanguage ?language . }
-    }
-    """ % (movie_uri, movie_uri, movie_uri, movie_uri, movie_uri, movie_uri, movie_uri)
-    
-    results = graph.query(query)
+        Dictionary with movie details; the list values hold distinct names
+        in the order they appear in the data
+    """
+    movie = URIRef(movie_uri)
     
     details = {
         'title': None,
@@ -313,24 +242,25 @@ def query_movie_details(graph, movie_uri):
         'languages': []
     }
     
-    for row in results:
-        if row.title:
-            details['title'] = str(row.title)
-        if row.rating:
-            details['rating'] = float(row.rating)
-        if row.year:
-            details['year'] = int(row.year)
-        if row.director and str(row.director) not in details['directors']:
-            details['directors'].append(str(row.director).split('#')[-1].replace('director_', '').replace('_', ' '))
-        if row.actor and str(row.actor) not in details['actors']:
-            details['actors'].append(str(row.actor).split('#')[-1].replace('actor_', '').replace('_', ' '))
-        if row.genre and str(row.genre) not in details['genres']:
-            details['genres'].append(str(row.genre).split('#')[-1].replace('genre_', '').replace('_', ' '))
-        if row.language and str(row.language) not in details['languages']:
-            details['languages'].append(str(row.language).split('#')[-1].replace('lang_', '').replace('_', ' '))
+    # Movies without a title have no details
+    title = graph.value(movie, RDFS.label)
+    if title is None:
+        return details
+    
+    details['title'] = str(title)
+    rating = graph.value(movie, EX.hasRating)
+    if rating is not None:
+        details['rating'] = float(rating)
+    year = graph.value(movie, EX.releasedIn)
+    if year is not None:
+        details['year'] = int(year)
+    # Display names are memoized per URI by local_label
+    for key, predicate in _DETAIL_LISTS:
+        details[key] = [local_label(obj)[1] for obj in dict.fromkeys(graph.objects(movie, predicate))]
     
     return details
 
+@lru_cache(maxsize=256)
 def get_all_movies(graph):
     """
     Get all movies with their basic information.
@@ -341,32 +271,13 @@ def get_all_movies(graph):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    # Use a simpler approach that avoids SPARQL parsing issues
-    from movie_ontology import EX
-    from rdflib import RDF, RDFS
-    
-    movies = []
-    for movie_uri in graph.subjects(RDF.type, EX.Movie):
-        # Get title
-        titles = list(graph.objects(movie_uri, RDFS.label))
-        if not titles:
-            continue
-        title = str(titles[0])
-        
-        # Get rating
-        ratings = list(graph.objects(movie_uri, EX.hasRating))
-        rating = float(ratings[0]) if ratings else 0.0
-        
-        movies.append((str(movie_uri), title, rating))
-    
-    # Sort by rating descending
-    movies.sort(key=lambda x: x[2], reverse=True)
-    return movies
+    return [(uri, title, rating if rating is not None else 0.0)
+            for uri, title, rating, _ in get_movie_catalog(graph)]
 
 def query_by_preferences(graph, preferences, limit=10):
     """
     Find movies matching user preferences.
-    Uses direct graph traversal to avoid SPARQL parsing issues.
+    Filters the rating-ordered movie catalog, so no sort is needed.
     
     Args:
         graph: RDF Graph containing movie data
@@ -376,57 +287,180 @@ def query_by_preferences(graph, preferences, limit=10):
     Returns:
         List of tuples (movie_uri, title, rating)
     """
-    from rdflib import RDF, RDFS
+    return _cached_preferences(graph, freeze_preferences(preferences), limit)
+
+def freeze_preferences(preferences):
+    """
+    Turn a preferences dictionary into a hashable cache key. Sets become
+    tuples sorted by repr (so mixed-type sets work too) and other iterables
+    (lists, generators, ...) tuples; strings and scalars are kept as they are.
+    """
+    if not preferences:
+        return None
+    return tuple(sorted((key, _freeze_value(value)) for key, value in preferences.items()))
+
+def _freeze_value(value):
+    """Make one preference value hashable for freeze_preferences."""
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value, key=repr))
+    if isinstance(value, (str, bytes)) or not isinstance(value, Iterable):
+        return value
+    return tuple(value)
+
+@lru_cache(maxsize=256)
+def _cached_preferences(graph, prefs_key, limit):
+    """Match movies for query_by_preferences on a cache miss."""
+    preferences = dict(prefs_key) if prefs_key else {}
+    
+    # Movies carrying the requested genres, director and mood, from the inverse index
+    index = get_movie_index(graph)
+    genre_movies = director_movies = mood_movies = None
+    if preferences.get('genres'):
+        genre_movies = set()
+        for genre in preferences['genres']:
+            genre_movies.update(index.get(('genres', instance_uri('genre', genre)), ()))
+    if preferences.get('director'):
+        director_movies = set(index.get(('directors', instance_uri('director', preferences['director'])), ()))
+    if preferences.get('mood'):
+        mood_movies = set(index.get(('moods', instance_uri('mood', preferences['mood'])), ()))
     
     matching_movies = []
     
-    for movie_uri in graph.subjects(RDF.type, EX.Movie):
-        # Get movie details
-        titles = list(graph.objects(movie_uri, RDFS.label))
-        if not titles:
-            continue
-        title = str(titles[0])
-        
-        ratings = list(graph.objects(movie_uri, EX.hasRating))
-        rating = float(ratings[0]) if ratings else 0.0
-        
-        # Check preferences
-        matches = True
+    for uri, title, rating, year in get_movie_catalog(graph):
+        if len(matching_movies) == limit:
+            break
+        rating = rating if rating is not None else 0.0
         
         # Genre filter
-        if preferences.get('genres'):
-            movie_genres = [str(g).split('#')[-1].replace('genre_', '').replace('_', ' ') for g in graph.objects(movie_uri, EX.hasGenre)]
-            requested_genres = preferences['genres']
-            if not any(genre in movie_genres for genre in requested_genres):
-                matches = False
+        if genre_movies is not None and uri not in genre_movies:
+            continue
         
         # Rating filter
-        if matches and preferences.get('min_rating'):
-            if rating < preferences['min_rating']:
-                matches = False
+        if preferences.get('min_rating') is not None and rating < preferences['min_rating']:
+            continue
         
         # Director filter
-        if matches and preferences.get('director'):
-            movie_directors = [str(d).split('#')[-1].replace('director_', '').replace('_', ' ') for d in graph.objects(movie_uri, EX.directedBy)]
-            if preferences['director'] not in movie_directors:
-                matches = False
+        if director_movies is not None and uri not in director_movies:
+            continue
         
         # Mood filter
-        if matches and preferences.get('mood'):
-            movie_moods = [str(m).split('#')[-1].replace('mood_', '').replace('_', ' ') for m in graph.objects(movie_uri, EX.hasMood)]
-            if preferences['mood'] not in movie_moods:
-                matches = False
+        if mood_movies is not None and uri not in mood_movies:
+            continue
         
         # Year filter
-        if matches and preferences.get('year'):
-            years = list(graph.objects(movie_uri, EX.releasedIn))
-            if not any(int(str(y)) == preferences['year'] for y in years):
-                matches = False
+        if preferences.get('year') and year != preferences['year']:
+            continue
+        
+        matching_movies.append((uri, title, rating))
+    
+    return matching_movies
+
+
+def query_movie_features(graph, movie_uris):
+    """
+    Fetch the attributes used for explanations for several movies at once.
+    get_movie_feature_table builds its table with this, and the explanation
+    generator uses it for single URIs that are not in that table.
+    
+    Args:
+        graph: RDF Graph containing movie data
+        movie_uris: Iterable of movie URIs (strings or URIRefs)
+        
+    Returns:
+        Dictionary mapping each movie URI string to a dictionary with
+        title, rating, year, genres, actors, directors, moods, languages
+        and similar (movies linked through ex:hasSimilarity)
+    """
+    
+    list_keys = {
+        EX.hasGenre: 'genres',
+        EX.hasActor: 'actors',
+        EX.directedBy: 'directors',
+        EX.hasMood: 'moods',
+        EX.hasLanguage: 'languages',
+        EX.hasSimilarity: 'similar'
+    }
+    
+    features = {}
+    for uri in movie_uris:
+        subject = URIRef(uri)
+        movie = {key: list(graph.objects(subject, pred)) for pred, key in list_keys.items()}
+        movie['title'] = next((str(o) for o in graph.objects(subject, RDFS.label)), None)
+        movie['rating'] = next((float(o) for o in graph.objects(subject, EX.hasRating)), None)
+        movie['year'] = next((int(o) for o in graph.objects(subject, EX.releasedIn)), None)
+        features[str(uri)] = movie
+    
+    return features
+
+@lru_cache(maxsize=8)
+def get_movie_feature_table(graph):
+    """
+    Get the attributes of every movie in the graph.
+    The table is built once per graph and shared between callers, so it
+    must not be mutated; call clear_query_cache() after changing the graph.
+    
+    Args:
+        graph: RDF Graph containing movie data
         
-        if matches:
-            matching_movies.append((str(movie_uri), title, rating))
+    Returns:
+        Dictionary mapping movie URI strings to attribute dictionaries
+        (see query_movie_features), in graph order
+    """
+    return query_movie_features(graph, graph.subjects(RDF.type, EX.Movie))
+
+@lru_cache(maxsize=8)
+def get_movie_catalog(graph):
+    """
+    Get one row per titled movie, ordered best rated first; movies without a
+    rating come last and ties keep graph order. Built once per graph from the
+    feature table and shared between callers, like the table itself.
     
-    # Sort by rating descending
-    matching_movies.sort(key=lambda x: x[2], reverse=True)
-    return matching_movies[:limit]
+    Args:
+        graph: RDF Graph containing movie data
+        
+    Returns:
+        Tuple of (movie_uri, title, rating, year) rows; rating and year
+        are None when the movie has none
+    """
+    rows = [(uri, movie['title'], movie['rating'], movie['year'])
+            for uri, movie in get_movie_feature_table(graph).items()
+            if movie['title'] is not None]
+    rows.sort(key=lambda row: row[2] if row[2] is not None else 0.0, reverse=True)
+    return tuple(rows)
+
+# Feature table keys that get_movie_index inverts
+_INDEXED_KEYS = ('genres', 'actors', 'directors', 'moods', 'languages')
+
+@lru_cache(maxsize=8)
+def get_movie_index(graph):
+    """
+    Get the inverse of the movie feature table: the movies that have a given
+    genre, actor, director, mood or language. Built once per graph and shared
+    between callers, like the feature table itself.
+    
+    Args:
+        graph: RDF Graph containing movie data
+        
+    Returns:
+        Dictionary mapping (feature key, URIRef) pairs, e.g.
+        ('genres', ex:genre_Drama), to lists of movie URI strings in graph order
+    """
+    index = defaultdict(list)
+    for movie_key, movie in get_movie_feature_table(graph).items():
+        for key in _INDEXED_KEYS:
+            for value in movie[key]:
+                index[key, value].append(movie_key)
+    return dict(index)
+
+# Memoized functions, emptied together by clear_query_cache
+_CACHED_QUERIES = (
+    query_similar_movies, query_by_genre, query_by_rating, query_by_actor,
+    query_by_director, query_by_year_range, query_high_rated_by_genre,
+    query_movie_details, get_all_movies, _cached_preferences,
+    get_movie_feature_table, get_movie_catalog, get_movie_index
+)
 
+def clear_query_cache():
+    """Drop cached query results, movie feature tables and their inverse indexes."""
+    for query in _CACHED_QUERIES:
+        query.cache_clear()
@@ -3,224 +3,300 @@ Semantic Reasoning Engine
 Uses SWRL-like rules to infer new facts from the RDF knowledge base.
 """
 
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from itertools import combinations
 from rdflib import Graph, Namespace, RDF, RDFS, Literal, XSD
 from movie_ontology import EX
 
-def infer_similar_movies(graph):
+@dataclass
+class _KnowledgeIndex:
+    """Asserted facts the rules read, gathered by _build_indexes."""
+    movies: list = field(default_factory=list)
+    actors: list = field(default_factory=list)
+    directors: list = field(default_factory=list)
+    genres: list = field(default_factory=list)
+    directors_of: dict = field(default_factory=lambda: defaultdict(list))
+    genres_of: dict = field(default_factory=lambda: defaultdict(list))
+    rating_of: dict = field(default_factory=dict)
+    actors_of: dict = field(default_factory=lambda: defaultdict(list))
+    moods_of: dict = field(default_factory=lambda: defaultdict(list))
+    movie_counts_of_director: Counter = field(default_factory=Counter)
+    movie_counts_of_genre: Counter = field(default_factory=Counter)
+
+def _build_indexes(graph):
+    """
+    Read everything the rules depend on in one scan per predicate, so the
+    rules work from dictionaries instead of querying the graph per entity.
+    None of the rules infer these classes or predicates, so one index serves
+    a whole reasoning pass.
+    
+    Args:
+        graph: RDF Graph containing movie data
+        
+    Returns:
+        _KnowledgeIndex with instance lists and per-entity object lists,
+        each movie's rating, and movie counts per director and genre
+    """
+    index = _KnowledgeIndex()
+    
+    instances = {EX.Movie: index.movies, EX.Actor: index.actors,
+                 EX.Director: index.directors, EX.Genre: index.genres}
+    for subject, cls in graph.subject_objects(RDF.type):
+        if cls in instances:
+            instances[cls].append(subject)
+    
+    # The predicate sweep lists each subject's objects in index order, not in
+    # the subject's own order, so these lists are only used as sets
+    for objects, predicate in ((index.directors_of, EX.directedBy), (index.genres_of, EX.hasGenre),
+                               (index.actors_of, EX.hasActor), (index.moods_of, EX.hasMood)):
+        for subject, obj in graph.subject_objects(predicate):
+            objects[subject].append(obj)
+    
+    # A movie's rating is its first one in graph.objects order, the same value
+    # the feature table in queries.py reports when a movie has several
+    for movie in index.movies:
+        rating = next(graph.objects(movie, EX.hasRating), None)
+        if rating is not None:
+            index.rating_of[movie] = float(rating)
+    
+    for counts, objects in ((index.movie_counts_of_director, index.directors_of),
+                            (index.movie_counts_of_genre, index.genres_of)):
+        for values in objects.values():
+            counts.update(values)
+    
+    return index
+
+def _symmetric_quads(graph, pairs, predicate, position):
+    """
+    Expand (a, b) pairs with a < b into quads for both directions.
+    
+    Pairs are emitted in the order a nested loop over position's keys would
+    have found them, so the graph's triple order does not depend on how the
+    pairs were collected.
+    
+    Args:
+        graph: RDF Graph the quads are for
+        pairs: Iterable of (a, b) node pairs with a < b
+        predicate: Symmetric predicate to assert
+        position: Dictionary mapping each node to its index in the scan order
+        
+    Returns:
+        List of quads for graph.addN
+    """
+    quads = []
+    for a, b in sorted(pairs, key=lambda pair: (position[pair[0]], position[pair[1]])):
+        quads.append((a, predicate, b, graph))
+        quads.append((b, predicate, a, graph))
+    return quads
+
+def infer_similar_movies(graph, index=None):
     """
     Rule: If two movies share the same director AND at least one genre,
-    mark them as similar.
+    mark them as similar. The relation is added in both directions.
+    Co-directed movies match when they have the same set of directors,
+    in whatever order the graph lists them.
     
     Args:
         graph: RDF Graph containing movie data
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with inferred similarity relationships added
     """
     from rdflib import URIRef
     
-    # Add similarity property if not exists
-    if not (EX.hasSimilarity, None, None) in graph:
-        graph.add((EX.hasSimilarity, RDF.type, RDF.Property))
-        graph.add((EX.hasSimilarity, RDFS.domain, EX.Movie))
-        graph.add((EX.hasSimilarity, RDFS.range, EX.Movie))
-    
-    movies = list(graph.subjects(RDF.type, EX.Movie))
-    
-    for movie1 in movies:
-        for movie2 in movies:
-            if movie1 >= movie2:  # Avoid duplicates and self-comparisons
-                continue
-            
-            # Get directors
-            dir1 = list(graph.objects(movie1, EX.directedBy))
-            dir2 = list(graph.objects(movie2, EX.directedBy))
-            
-            # Get genres
-            genres1 = set(graph.objects(movie1, EX.hasGenre))
-            genres2 = set(graph.objects(movie2, EX.hasGenre))
-            
-            # Check if same director and share at least one genre
-            if dir1 and dir2 and dir1 == dir2 and genres1.intersection(genres2):
-                graph.add((movie1, EX.hasSimilarity, movie2))
-                graph.add((movie2, EX.hasSimilarity, movie1))
+    # Declare the property; re-adding existing triples is a no-op
+    graph.add((EX.hasSimilarity, RDF.type, RDF.Property))
+    graph.add((EX.hasSimilarity, RDFS.domain, EX.Movie))
+    graph.add((EX.hasSimilarity, RDFS.range, EX.Movie))
+    
+    index = index or _build_indexes(graph)
+    movies = index.movies
+    position = {movie: i for i, movie in enumerate(movies)}
+    
+    # Only movies with the same director(s) can match, so compare within those groups
+    by_directors = defaultdict(list)
+    for movie in movies:
+        directors = frozenset(index.directors_of.get(movie, ()))
+        if directors:
+            by_directors[directors].append(movie)
+    
+    pairs = []
+    for group in by_directors.values():
+        genres = {movie: set(index.genres_of.get(movie, ())) for movie in group}
+        for movie1, movie2 in combinations(sorted(group), 2):
+            if genres[movie1].intersection(genres[movie2]):
+                pairs.append((movie1, movie2))
+    
+    graph.addN(_symmetric_quads(graph, pairs, EX.hasSimilarity, position))
     
     return graph
 
-def infer_high_rated_movies(graph, threshold=8.5):
+def infer_high_rated_movies(graph, threshold=8.5, index=None):
     """
     Rule: Mark movies with rating >= threshold as high-rated.
+    A movie with several ratings is judged by its first in graph.objects order.
     
     Args:
         graph: RDF Graph containing movie data
         threshold: Rating threshold (default 8.5)
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with high-rated classification added
     """
-    if not (EX.HighRatedMovie, None, None) in graph:
-        graph.add((EX.HighRatedMovie, RDF.type, RDFS.Class))
-        graph.add((EX.HighRatedMovie, RDFS.subClassOf, EX.Movie))
+    graph.add((EX.HighRatedMovie, RDF.type, RDFS.Class))
+    graph.add((EX.HighRatedMovie, RDFS.subClassOf, EX.Movie))
     
-    movies = list(graph.subjects(RDF.type, EX.Movie))
+    index = index or _build_indexes(graph)
     
-    for movie in movies:
-        ratings = list(graph.objects(movie, EX.hasRating))
-        if ratings and float(ratings[0]) >= threshold:
-            graph.add((movie, RDF.type, EX.HighRatedMovie))
+    high_rated = []
+    for movie in index.movies:
+        rating = index.rating_of.get(movie)
+        if rating is not None and rating >= threshold:
+            high_rated.append((movie, RDF.type, EX.HighRatedMovie, graph))
+    graph.addN(high_rated)
     
     return graph
 
-def infer_director_expertise(graph):
+def infer_director_expertise(graph, index=None):
     """
     Rule: If a director has directed 3+ movies, mark them as experienced.
     
     Args:
         graph: RDF Graph containing movie data
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with director expertise classification added
     """
-    if not (EX.ExperiencedDirector, None, None) in graph:
-        graph.add((EX.ExperiencedDirector, RDF.type, RDFS.Class))
-        graph.add((EX.ExperiencedDirector, RDFS.subClassOf, EX.Director))
+    graph.add((EX.ExperiencedDirector, RDF.type, RDFS.Class))
+    graph.add((EX.ExperiencedDirector, RDFS.subClassOf, EX.Director))
     
-    directors = list(graph.subjects(RDF.type, EX.Director))
+    index = index or _build_indexes(graph)
     
-    for director in directors:
-        movies = list(graph.subjects(EX.directedBy, director))
-        if len(movies) >= 3:
-            graph.add((director, RDF.type, EX.ExperiencedDirector))
+    graph.addN((director, RDF.type, EX.ExperiencedDirector, graph)
+               for director in index.directors
+               if index.movie_counts_of_director[director] >= 3)
     
     return graph
 
-def infer_actor_collaborations(graph):
+def infer_actor_collaborations(graph, index=None):
     """
     Rule: If two actors appear in 2+ movies together, mark them as frequent collaborators.
     
     Args:
         graph: RDF Graph containing movie data
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with collaboration relationships added
     """
-    if not (EX.frequentlyCollaboratesWith, None, None) in graph:
-        graph.add((EX.frequentlyCollaboratesWith, RDF.type, RDF.Property))
-        graph.add((EX.frequentlyCollaboratesWith, RDFS.domain, EX.Actor))
-        graph.add((EX.frequentlyCollaboratesWith, RDFS.range, EX.Actor))
-    
-    actors = list(graph.subjects(RDF.type, EX.Actor))
-    
-    # Build actor-to-movies mapping
-    actor_movies = {}
-    for actor in actors:
-        actor_movies[actor] = set(graph.subjects(EX.hasActor, actor))
-    
-    # Find frequent collaborations
-    for actor1 in actors:
-        for actor2 in actors:
-            if actor1 >= actor2:
-                continue
-            
-            movies1 = actor_movies[actor1]
-            movies2 = actor_movies[actor2]
-            common_movies = movies1.intersection(movies2)
-            
-            if len(common_movies) >= 2:
-                graph.add((actor1, EX.frequentlyCollaboratesWith, actor2))
-                graph.add((actor2, EX.frequentlyCollaboratesWith, actor1))
+    graph.add((EX.frequentlyCollaboratesWith, RDF.type, RDF.Property))
+    graph.add((EX.frequentlyCollaboratesWith, RDFS.domain, EX.Actor))
+    graph.add((EX.frequentlyCollaboratesWith, RDFS.range, EX.Actor))
+    
+    index = index or _build_indexes(graph)
+    actors = index.actors
+    position = {actor: i for i, actor in enumerate(actors)}
+    
+    # Count the movies each pair of actors shares, from each movie's cast
+    shared_movies = Counter()
+    for cast in index.actors_of.values():
+        actors_in_movie = {actor for actor in cast if actor in position}
+        shared_movies.update(combinations(sorted(actors_in_movie), 2))
+    
+    pairs = [pair for pair, count in shared_movies.items() if count >= 2]
+    graph.addN(_symmetric_quads(graph, pairs, EX.frequentlyCollaboratesWith, position))
     
     return graph
 
-def infer_genre_popularity(graph):
+def infer_genre_popularity(graph, index=None):
     """
     Rule: If a genre appears in 10+ movies, mark it as popular.
     
     Args:
         graph: RDF Graph containing movie data
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with genre popularity classification added
     """
-    if not (EX.PopularGenre, None, None) in graph:
-        graph.add((EX.PopularGenre, RDF.type, RDFS.Class))
-        graph.add((EX.PopularGenre, RDFS.subClassOf, EX.Genre))
+    graph.add((EX.PopularGenre, RDF.type, RDFS.Class))
+    graph.add((EX.PopularGenre, RDFS.subClassOf, EX.Genre))
     
-    genres = list(graph.subjects(RDF.type, EX.Genre))
+    index = index or _build_indexes(graph)
     
-    for genre in genres:
-        movies = list(graph.subjects(EX.hasGenre, genre))
-        if len(movies) >= 10:
-            graph.add((genre, RDF.type, EX.PopularGenre))
+    graph.addN((genre, RDF.type, EX.PopularGenre, graph)
+               for genre in index.genres
+               if index.movie_counts_of_genre[genre] >= 10)
     
     return graph
 
-def infer_highly_comparable_movies(graph, rating_diff_threshold=0.5):
+def infer_highly_comparable_movies(graph, rating_diff_threshold=0.5, index=None):
     """
     Rule: If two movies have rating difference < threshold, mark as HighlyComparable.
     
     Args:
         graph: RDF Graph containing movie data
         rating_diff_threshold: Maximum rating difference (default 0.5)
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with highly comparable relationships added
     """
-    if not (EX.HighlyComparable, None, None) in graph:
-        graph.add((EX.HighlyComparable, RDF.type, RDF.Property))
-        graph.add((EX.HighlyComparable, RDFS.domain, EX.Movie))
-        graph.add((EX.HighlyComparable, RDFS.range, EX.Movie))
+    graph.add((EX.HighlyComparable, RDF.type, RDF.Property))
+    graph.add((EX.HighlyComparable, RDFS.domain, EX.Movie))
+    graph.add((EX.HighlyComparable, RDFS.range, EX.Movie))
     
-    movies = list(graph.subjects(RDF.type, EX.Movie))
+    index = index or _build_indexes(graph)
+    movies = index.movies
+    position = {movie: i for i, movie in enumerate(movies)}
     
-    for movie1 in movies:
-        ratings1 = list(graph.objects(movie1, EX.hasRating))
-        if not ratings1:
-            continue
-        
-        rating1 = float(ratings1[0])
-        
-        for movie2 in movies:
-            if movie1 >= movie2:
-                continue
-            
-            ratings2 = list(graph.objects(movie2, EX.hasRating))
-            if not ratings2:
-                continue
-            
-            rating2 = float(ratings2[0])
-            
-            if abs(rating1 - rating2) < rating_diff_threshold:
-                graph.add((movie1, EX.HighlyComparable, movie2))
-                graph.add((movie2, EX.HighlyComparable, movie1))
+    rated = [(index.rating_of[movie], movie) for movie in movies if movie in index.rating_of]
+    
+    # Sweep the movies in rating order; each one only pairs with the run of
+    # movies rated less than the threshold above it
+    rated.sort(key=lambda item: item[0])
+    pairs = []
+    for i, (rating1, movie1) in enumerate(rated):
+        for j in range(i + 1, len(rated)):
+            rating2, movie2 = rated[j]
+            if rating2 - rating1 >= rating_diff_threshold:
+                break
+            pairs.append((min(movie1, movie2), max(movie1, movie2)))
+    
+    graph.addN(_symmetric_quads(graph, pairs, EX.HighlyComparable, position))
     
     return graph
 
-def infer_mood_similarity(graph):
+def infer_mood_similarity(graph, index=None):
     """
     Rule: If two movies share the same mood, mark them as mood-similar.
     
     Args:
         graph: RDF Graph containing movie data
+        index: _KnowledgeIndex for the graph (built from graph if omitted)
         
     Returns:
         Graph with mood similarity relationships added
     """
-    movies = list(graph.subjects(RDF.type, EX.Movie))
+    index = index or _build_indexes(graph)
+    movies = index.movies
+    position = {movie: i for i, movie in enumerate(movies)}
     
-    for movie1 in movies:
-        moods1 = set(graph.objects(movie1, EX.hasMood))
-        if not moods1:
-            continue
-        
-        for movie2 in movies:
-            if movie1 >= movie2:
-                continue
-            
-            moods2 = set(graph.objects(movie2, EX.hasMood))
-            if moods1.intersection(moods2):
-                graph.add((movie1, EX.SimilarTo, movie2))
-                graph.add((movie2, EX.SimilarTo, movie1))
+    # Group movies by mood; every pair within a group shares that mood
+    by_mood = defaultdict(list)
+    for movie in movies:
+        for mood in set(index.moods_of.get(movie, ())):
+            by_mood[mood].append(movie)
+    
+    pairs = set()
+    for group in by_mood.values():
+        pairs.update(combinations(sorted(group), 2))
+    
+    graph.addN(_symmetric_quads(graph, pairs, EX.SimilarTo, position))
     
     return graph
 
@@ -228,6 +304,11 @@ def apply_all_rules(graph):
     """
     Apply all inference rules to the graph.
     
+    When rerunning the rules on a graph that was already queried, the
+    results memoized against it are stale: call app.refresh_caches() in the
+    web app, or explanation_generator.clear_caches() and
+    visualize.clear_render_cache() when using the modules directly.
+    
     Args:
         graph: RDF Graph containing movie data
         
@@ -237,25 +318,27 @@ def apply_all_rules(graph):
     print("Applying semantic reasoning rules...")
     print(f"  Initial triples: {len(graph)}")
     
-    graph = infer_similar_movies(graph)
+    index = _build_indexes(graph)
+    
+    graph = infer_similar_movies(graph, index)
     print(f"  After similarity inference: {len(graph)}")
     
-    graph = infer_high_rated_movies(graph)
+    graph = infer_high_rated_movies(graph, index=index)
     print(f"  After high-rated inference: {len(graph)}")
     
-    graph = infer_director_expertise(graph)
+    graph = infer_director_expertise(graph, index)
     print(f"  After director expertise inference: {len(graph)}")
     
-    graph = infer_actor_collaborations(graph)
+    graph = infer_actor_collaborations(graph, index)
     print(f"  After actor collaboration inference: {len(graph)}")
     
-    graph = infer_genre_popularity(graph)
+    graph = infer_genre_popularity(graph, index)
     print(f"  After genre popularity inference: {len(graph)}")
     
-    graph = infer_highly_comparable_movies(graph)
+    graph = infer_highly_comparable_movies(graph, index=index)
     print(f"  After highly comparable inference: {len(graph)}")
     
-    graph = infer_mood_similarity(graph)
+    graph = infer_mood_similarity(graph, index)
     print(f"  After mood similarity inference: {len(graph)}")
     
     print(f"  Final triples: {len(graph)}\n")
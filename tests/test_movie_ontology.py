@@ -0,0 +1,33 @@
+"""
+Tests for bulk_add_movies in movie_ontology.py.
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import unittest
+from rdflib import XSD
+from movie_ontology import EX, create_ontology, bulk_add_movies
+
+
+class BulkAddMoviesTest(unittest.TestCase):
+
+    def test_small_rating_is_a_valid_decimal(self):
+        graph = create_ontology()
+        bulk_add_movies(graph, [{'id': 'a', 'title': 'A', 'rating': 1e-05}])
+
+        rating = graph.value(EX.m_a, EX.hasRating)
+        self.assertEqual(rating.datatype, XSD.decimal)
+        self.assertEqual(str(rating), '0.00001')
+
+    def test_string_list_field_is_rejected(self):
+        graph = create_ontology()
+        with self.assertRaises(TypeError):
+            bulk_add_movies(graph, [{'id': 'a', 'title': 'A', 'genres': 'Drama'}])
+
+    def test_non_numeric_rating_is_rejected(self):
+        graph = create_ontology()
+        with self.assertRaises(ValueError):
+            bulk_add_movies(graph, [{'id': 'a', 'title': 'A', 'rating': 'nan'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""
+Tests for the preference handling in queries.py.
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import unittest
+from queries import freeze_preferences
+
+
+class FreezePreferencesTest(unittest.TestCase):
+
+    def test_set_of_mixed_types_is_frozen(self):
+        key = freeze_preferences({'genres': {1, 'a'}})
+
+        self.assertEqual(key, (('genres', ('a', 1)),))
+        hash(key)
+
+    def test_equal_sets_give_equal_keys(self):
+        self.assertEqual(freeze_preferences({'genres': {'Drama', 'Crime'}}),
+                         freeze_preferences({'genres': {'Crime', 'Drama'}}))
+
+    def test_iterables_become_tuples(self):
+        key = freeze_preferences({'genres': (genre for genre in ['Drama']), 'mood': 'Dark'})
+
+        self.assertEqual(key, (('genres', ('Drama',)), ('mood', 'Dark')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests for the inference rules in semantic_reasoner.py.
+Run from the repository root with: python -m unittest discover tests
+"""
+
+import unittest
+from rdflib import RDF, Literal, XSD
+from movie_ontology import EX, create_ontology
+from semantic_reasoner import infer_similar_movies, infer_high_rated_movies
+
+
+def add_movie(graph, name, directors=(), genres=(), ratings=()):
+    """Add a movie with its directors, genres and ratings, in the given order."""
+    movie = EX[f"m_{name}"]
+    graph.add((movie, RDF.type, EX.Movie))
+    for director in directors:
+        graph.add((movie, EX.directedBy, EX[f"director_{director}"]))
+    for genre in genres:
+        graph.add((movie, EX.hasGenre, EX[f"genre_{genre}"]))
+    for rating in ratings:
+        graph.add((movie, EX.hasRating, Literal(rating, datatype=XSD.decimal)))
+    return movie
+
+
+class SimilarMoviesTest(unittest.TestCase):
+
+    def test_co_directors_match_in_any_order(self):
+        graph = create_ontology()
+        m_a = add_movie(graph, 'a', directors=('X', 'Y'), genres=('Drama',))
+        m_b = add_movie(graph, 'b', directors=('Y', 'X'), genres=('Drama',))
+        m_c = add_movie(graph, 'c', directors=('Z',), genres=('Crime',))
+        m_d = add_movie(graph, 'd', directors=('Z',), genres=('Crime',))
+
+        infer_similar_movies(graph)
+
+        self.assertIn((m_a, EX.hasSimilarity, m_b), graph)
+        self.assertIn((m_b, EX.hasSimilarity, m_a), graph)
+        self.assertIn((m_c, EX.hasSimilarity, m_d), graph)
+        self.assertNotIn((m_a, EX.hasSimilarity, m_c), graph)
+
+    def test_different_director_sets_do_not_match(self):
+        graph = create_ontology()
+        m_a = add_movie(graph, 'a', directors=('X', 'Y'), genres=('Drama',))
+        m_b = add_movie(graph, 'b', directors=('X',), genres=('Drama',))
+
+        infer_similar_movies(graph)
+
+        self.assertNotIn((m_a, EX.hasSimilarity, m_b), graph)
+
+
+class HighRatedMoviesTest(unittest.TestCase):
+
+    def test_first_rating_in_graph_order_decides(self):
+        graph = create_ontology()
+        m_a = add_movie(graph, 'a', ratings=('8.0',))
+        m_b = add_movie(graph, 'b', ratings=('9.0', '8.0'))
+
+        infer_high_rated_movies(graph)
+
+        self.assertNotIn((m_a, RDF.type, EX.HighRatedMovie), graph)
+        self.assertIn((m_b, RDF.type, EX.HighRatedMovie), graph)
+
+    def test_agrees_with_feature_table(self):
+        from queries import get_movie_feature_table
+
+        graph = create_ontology()
+        m_b = add_movie(graph, 'b', ratings=('9.0', '8.0'))
+
+        infer_high_rated_movies(graph)
+
+        rating = get_movie_feature_table(graph)[str(m_b)]['rating']
+        self.assertEqual(rating >= 8.5, (m_b, RDF.type, EX.HighRatedMovie) in graph)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,301 +3,280 @@ Enhanced Knowledge Graph Visualization
 Creates an interactive graph showing ontology structure and movie relationships.
 """
 
-import networkx as nx
+import copy
+from functools import lru_cache
+import hashlib
+import heapq
+import jinja2
 from pyvis.network import Network
-import uuid
-import re
-import math
-from rdflib import RDF, RDFS
-from movie_ontology import EX
+import os
+from movie_ontology import local_label
+from queries import get_movie_feature_table
 
+# The app's templates, for rendering the visualization page outside Flask
+_TEMPLATES = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
+    autoescape=True
+)
+
+# Stylesheet the app serves at /static/graph.css; inlined into standalone pages
+_GRAPH_CSS = os.path.join(os.path.dirname(__file__), 'static', 'graph.css')
+
+@lru_cache(maxsize=4096)
 def clean_label(uri):
-    """Extract and clean a readable label from URI"""
-    label = uri.split("#")[-1]
-    label = re.sub(r'^(m_|actor_|director_|genre_|lang_|mood_)', '', label)
-    label = label.replace("_", " ")
-    label = label.title()
-    return label
+    """Extract and clean a readable label from URI (memoized, since genres,
+    directors and actors repeat across movies)"""
+    return local_label(uri)[1].title()
 
-def get_node_type(node_id):
-    """Determine node type for styling"""
-    node_str = str(node_id)
-    if "m_" in node_str or "Movie" in node_str:
-        return "movie"
-    elif "actor_" in node_str or "Actor" in node_str:
-        return "actor"
-    elif "director_" in node_str or "Director" in node_str:
-        return "director"
-    elif "genre_" in node_str or "Genre" in node_str:
-        return "genre"
-    elif "lang_" in node_str or "Language" in node_str:
-        return "language"
-    elif "mood_" in node_str or "Mood" in node_str:
-        return "mood"
-    return "other"
+# Node count above which edges are hidden while the view is dragged or zoomed;
+# vis.js draws on a 2D canvas, and redrawing every edge per frame is what
+# makes large graphs stutter
+_LARGE_GRAPH_NODES = 100
 
-def visualize_ontology_graph(graph, max_movies=5):
-    """
-    Create a knowledge graph visualization showing 5 movie instances with their relationships.
-    Shows: Movies (red boxes) -> Actors, Directors, Genres, Ratings, Years
-    """
-    # Create visualization with dark background
-    net = Network(
-        height="100vh",
-        width="100%", 
-        bgcolor="#1A201E",
-        font_color="#FFFFFF",
-        directed=True,
-        notebook=False
-    )
-    
-    # Physics settings for better layout
-    net.set_options("""
-    {
-      "nodes": {
+# Node count above which the layout simulation run before the first frame is
+# capped; vis.js otherwise runs up to 1000 iterations before drawing anything
+_STABILIZED_GRAPH_NODES = 50
+_STABILIZATION_ITERATIONS = 200
+
+# vis.js options for every render
+_NETWORK_OPTIONS = {
+    "nodes": {
         "font": {
-          "size": 14,
-          "face": "Arial",
-          "color": "#FFFFFF"
+            "size": 14,
+            "face": "Arial",
+            "color": "#FFFFFF"
         },
         "borderWidth": 2
-      },
-      "edges": {
+    },
+    "edges": {
         "smooth": {
-          "type": "straight"
+            "type": "straight"
         },
         "arrows": {
-          "to": {
-            "enabled": true,
-            "scaleFactor": 1.2
-          }
+            "to": {
+                "enabled": True,
+                "scaleFactor": 1.2
+            }
         },
         "width": 2
-      },
-      "physics": {
-        "enabled": true,
+    },
+    "physics": {
+        "enabled": True,
         "barnesHut": {
-          "gravitationalConstant": -3000,
-          "centralGravity": 0.3,
-          "springLength": 200,
-          "springConstant": 0.04,
-          "damping": 0.09
+            "gravitationalConstant": -3000,
+            "centralGravity": 0.3,
+            "springLength": 200,
+            "springConstant": 0.04,
+            "damping": 0.09
         },
         "solver": "barnesHut"
-      },
-      "interaction": {
-        "hover": true,
-        "zoomView": true,
-        "dragView": true
-      }
+    },
+    "interaction": {
+        "hover": True,
+        "zoomView": True,
+        "dragView": True
     }
-    """)
+}
+
+# Node styles: movies are red boxes, genres green dots, directors yellow
+# triangles, actors cyan dots, and ratings and years grey dots. Shared
+# between nodes, since they are only serialized
+_MOVIE_STYLE = {"color": {"background": "#FF5252", "border": "#E53935"}, "size": 40, "shape": "box", "borderWidth": 3}
+_GENRE_STYLE = {"color": {"background": "#81C784", "border": "#66BB6A"}, "size": 25, "shape": "dot", "borderWidth": 2}
+_DIRECTOR_STYLE = {"color": {"background": "#FFC107", "border": "#FFB300"}, "size": 30, "shape": "triangle", "borderWidth": 2}
+_ACTOR_STYLE = {"color": {"background": "#4DD0E1", "border": "#00ACC1"}, "size": 25, "shape": "dot", "borderWidth": 2}
+_LITERAL_STYLE = {"color": {"background": "#9E9E9E", "border": "#757575"}, "size": 20, "shape": "dot", "borderWidth": 2}
+
+def _add_node(net, node_id, label, color, shape, **options):
+    """
+    Append a node to a pyvis Network without Network.add_node's linear scan
+    for duplicate ids; callers dedupe with their own set. Like add_node, the
+    node's font colour is the network's.
+    """
+    node = {'id': node_id, 'label': label, 'color': color, 'shape': shape,
+            'font': {'color': net.font_color}, **options}
+    net.nodes.append(node)
+    net.node_ids.append(node_id)
+    net.node_map[node_id] = node
+
+def _add_edge(net, source, to, **options):
+    """Append an edge to a pyvis Network without Network.add_edge's linear node lookups."""
+    net.edges.append({'from': source, 'to': to, **options})
+
+def _build_network(graph, max_movies):
+    """
+    Build the pyvis Network for the top-rated movies and their relationships.
+    
+    Args:
+        graph: RDF Graph containing movie data
+        max_movies: Number of movies to show
+        
+    Returns:
+        Tuple (network, list of the movie URIs shown)
+    """
+    # Create visualization with dark background
+    net = Network(
+        height="100vh",
+        width="100%", 
+        bgcolor="#1A201E",
+        font_color="#FFFFFF",
+        directed=True,
+        notebook=False
+    )
+    
+    # Physics settings for better layout (copied, since large graphs adjust them)
+    net.options = copy.deepcopy(_NETWORK_OPTIONS)
     
-    # Get top rated movies
-    from rdflib import URIRef
-    movies_with_ratings = []
-    for movie_uri in graph.subjects(RDF.type, EX.Movie):
-        ratings = list(graph.objects(movie_uri, EX.hasRating))
-        rating = float(ratings[0]) if ratings else 0.0
-        movies_with_ratings.append((str(movie_uri), rating))
+    # Per-movie attributes, read once per graph instead of once per lookup
+    features = get_movie_feature_table(graph)
     
-    # Sort by rating and take top movies
-    movies_with_ratings.sort(key=lambda x: x[1], reverse=True)
-    movies = [m[0] for m in movies_with_ratings[:max_movies]]
+    # Get top rated movies (nlargest keeps graph order among equal ratings, as a stable sort would)
+    movies_with_ratings = ((movie_uri_str, movie['rating'] if movie['rating'] is not None else 0.0)
+                           for movie_uri_str, movie in features.items())
+    movies = [m[0] for m in heapq.nlargest(max_movies, movies_with_ratings, key=lambda x: x[1])]
     
     # Track added nodes
     added_nodes = set()
     
     # Add movies (red boxes)
     for movie_uri_str in movies:
-        movie_uri = URIRef(movie_uri_str)
+        movie = features[movie_uri_str]
         movie_label = clean_label(movie_uri_str)
         
         # Get year and rating
-        years = list(graph.objects(movie_uri, EX.releasedIn))
-        ratings = list(graph.objects(movie_uri, EX.hasRating))
+        year = movie['year']
+        rating = movie['rating']
         
-        year_text = f" {int(years[0])}" if years else ""
-        rating_text = f" {float(ratings[0]):.1f}" if ratings else ""
+        year_text = f" {year}" if year is not None else ""
+        rating_text = f" {rating:.1f}" if rating is not None else ""
         
         # Add movie node
-        net.add_node(
-            movie_uri_str,
-            label=f"{movie_label}{rating_text}{year_text}",
-            color={"background": "#FF5252", "border": "#E53935"},
-            size=40,
-            shape="box",
-            font={"size": 15, "face": "Arial", "color": "#FFFFFF", "bold": True},
-            borderWidth=3
-        )
+        _add_node(net, movie_uri_str, label=f"{movie_label}{rating_text}{year_text}", **_MOVIE_STYLE)
         added_nodes.add(movie_uri_str)
         
         # Add genres (green circles)
-        genres = list(graph.objects(movie_uri, EX.hasGenre))
-        for genre in genres:
-            genre_uri = str(genre)
+        for genre_uri in map(str, movie['genres']):
             genre_label = clean_label(genre_uri)
             
             if genre_uri not in added_nodes:
-                net.add_node(
-                    genre_uri,
-                    label=genre_label,
-                    color={"background": "#81C784", "border": "#66BB6A"},
-                    size=25,
-                    shape="dot",
-                    font={"size": 12, "face": "Arial", "color": "#1A201E", "bold": True},
-                    borderWidth=2
-                )
+                _add_node(net, genre_uri, label=genre_label, **_GENRE_STYLE)
                 added_nodes.add(genre_uri)
             
-            net.add_edge(movie_uri_str, genre_uri, label="hasGenre", color="#81C784", arrows="to", width=2)
+            _add_edge(net, movie_uri_str, genre_uri, label="hasGenre", color="#81C784", arrows="to", width=2)
         
         # Add directors (yellow triangles)
-        directors = list(graph.objects(movie_uri, EX.directedBy))
-        for director in directors:
-            director_uri = str(director)
+        for director_uri in map(str, movie['directors']):
             director_label = clean_label(director_uri)
             
             if director_uri not in added_nodes:
-                net.add_node(
-                    director_uri,
-                    label=director_label,
-                    color={"background": "#FFC107", "border": "#FFB300"},
-                    size=30,
-                    shape="triangle",
-                    font={"size": 12, "face": "Arial", "color": "#1A201E", "bold": True},
-                    borderWidth=2
-                )
+                _add_node(net, director_uri, label=director_label, **_DIRECTOR_STYLE)
                 added_nodes.add(director_uri)
             
-            net.add_edge(movie_uri_str, director_uri, label="directedBy", color="#FFC107", arrows="to", width=3)
+            _add_edge(net, movie_uri_str, director_uri, label="directedBy", color="#FFC107", arrows="to", width=3)
         
         # Add actors (cyan circles) - limit to 1 per movie
-        actors = list(graph.objects(movie_uri, EX.hasActor))[:1]
-        for actor in actors:
-            actor_uri = str(actor)
+        for actor_uri in map(str, movie['actors'][:1]):
             actor_label = clean_label(actor_uri)
             
             if actor_uri not in added_nodes:
-                net.add_node(
-                    actor_uri,
-                    label=actor_label,
-                    color={"background": "#4DD0E1", "border": "#00ACC1"},
-                    size=25,
-                    shape="dot",
-                    font={"size": 12, "face": "Arial", "color": "#1A201E", "bold": True},
-                    borderWidth=2
-                )
+                _add_node(net, actor_uri, label=actor_label, **_ACTOR_STYLE)
                 added_nodes.add(actor_uri)
             
-            net.add_edge(movie_uri_str, actor_uri, label="hasActor", color="#4DD0E1", arrows="to", width=2)
+            _add_edge(net, movie_uri_str, actor_uri, label="hasActor", color="#4DD0E1", arrows="to", width=2)
         
-        # Add ratings (grey circles)
-        if ratings:
-            rating_value = str(int(float(ratings[0]))) if float(ratings[0]).is_integer() else str(float(ratings[0]))
-            rating_node_id = f"rating_{movie_uri_str}_{rating_value}"
+        # Add ratings (grey circles), one node per value shared by the movies that have it
+        if rating is not None:
+            rating_value = f"{rating:g}"
+            rating_node_id = f"rating_{rating_value}"
             if rating_node_id not in added_nodes:
-                net.add_node(
-                    rating_node_id,
-                    label=rating_value,
-                    color={"background": "#9E9E9E", "border": "#757575"},
-                    size=20,
-                    shape="dot",
-                    font={"size": 11, "face": "Arial", "color": "#FFFFFF", "bold": True},
-                    borderWidth=2
-                )
+                _add_node(net, rating_node_id, label=rating_value, **_LITERAL_STYLE)
                 added_nodes.add(rating_node_id)
-            net.add_edge(movie_uri_str, rating_node_id, label="hasRating", color="#9E9E9E", arrows="to", width=2)
+            _add_edge(net, movie_uri_str, rating_node_id, label="hasRating", color="#9E9E9E", arrows="to", width=2)
         
-        # Add years (grey circles)
-        if years:
-            year_value = str(int(years[0]))
-            year_node_id = f"year_{movie_uri_str}_{year_value}"
+        # Add years (grey circles), shared the same way
+        if year is not None:
+            year_value = str(year)
+            year_node_id = f"year_{year_value}"
             if year_node_id not in added_nodes:
-                net.add_node(
-                    year_node_id,
-                    label=year_value,
-                    color={"background": "#9E9E9E", "border": "#757575"},
-                    size=20,
-                    shape="dot",
-                    font={"size": 11, "face": "Arial", "color": "#FFFFFF", "bold": True},
-                    borderWidth=2
-                )
+                _add_node(net, year_node_id, label=year_value, **_LITERAL_STYLE)
                 added_nodes.add(year_node_id)
-            net.add_edge(movie_uri_str, year_node_id, label="releasedIn", color="#9E9E9E", arrows="to", width=2)
-    
-    # Generate filename
-    out = f"graph_{uuid.uuid4().hex}.html"
-    net.save_graph(out)
-    
-    # Read the generated HTML
-    with open(out, 'r', encoding='utf-8') as f:
-        html_content = f.read()
+            _add_edge(net, movie_uri_str, year_node_id, label="releasedIn", color="#9E9E9E", arrows="to", width=2)
     
-    # Inject header and styling into the existing HTML
-    import re
+    if len(net.nodes) > _STABILIZED_GRAPH_NODES:
+        net.options['physics']['stabilization'] = {'iterations': _STABILIZATION_ITERATIONS}
+    if len(net.nodes) > _LARGE_GRAPH_NODES:
+        net.options['interaction'].update(hideEdgesOnDrag=True, hideEdgesOnZoom=True)
     
-    # Find and replace the body tag to add header
-    body_pattern = r'<body[^>]*>'
-    header_html = '''<div class="graph-header">
-        <div>
-            <h1><span>📊</span>Knowledge Graph Visualization</h1>
-            <div class="info">Semantic Movie Ontology Structure & Relationships</div>
-        </div>
-        <div class="legend">
-            <div class="legend-item"><span class="legend-node legend-class box"></span><span>Class</span></div>
-            <div class="legend-item"><span class="legend-node legend-property"></span><span>Property</span></div>
-            <div class="legend-item"><span class="legend-node legend-movie box"></span><span>Movie</span></div>
-            <div class="legend-item"><span class="legend-node legend-genre"></span><span>Genre</span></div>
-            <div class="legend-item"><span class="legend-node legend-director triangle"></span><span>Director</span></div>
-            <div class="legend-item"><span class="legend-node legend-actor"></span><span>Actor</span></div>
-            <div class="legend-item"><span class="legend-node legend-language" style="background: #9575CD; border: 2px solid #7E57C2; width: 20px; height: 20px; border-radius: 50%; display: inline-block;"></span><span>Language</span></div>
-        </div>
-    </div>
-    <div class="controls">
-        <button class="control-btn" onclick="window.location.href='/'">← Back to Dashboard</button>
-        <button class="control-btn" onclick="location.reload()">🔄 Refresh</button>
-    </div>
-    <div class="graph-container">'''
-    
-    html_content = re.sub(body_pattern, '<body>' + header_html, html_content)
+    return net, movies
+
+@lru_cache(maxsize=8)
+def get_graph_data(graph, max_movies=5):
+    """
+    Get the visualization as data for a page that draws it with vis.js itself,
+    such as templates/graph.html.
+    Built once per graph and size and shared between callers, so it must not
+    be mutated; call clear_render_cache() after changing the graph.
     
-    # Wrap the network div
-    html_content = html_content.replace('</body>', '</div></body>')
+    Args:
+        graph: RDF Graph containing movie data
+        max_movies: Number of movies to show
+        
+    Returns:
+        Dictionary with the vis.js 'nodes', 'edges' and 'options'
+    """
+    net, _ = _build_network(graph, max_movies)
+    return {'nodes': net.nodes, 'edges': net.edges, 'options': net.options}
+
+def visualize_ontology_graph(graph, max_movies=5, return_html=False):
+    """
+    Create a knowledge graph visualization showing 5 movie instances with their relationships.
+    Shows: Movies (red boxes) -> Actors, Directors, Genres, Ratings, Years
     
-    # Add CSS and adjust styles
-    css_addition = '''<style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background: #0f1419; color: #ffffff; overflow: hidden; }
-        .graph-header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px 40px; box-shadow: 0 4px 20px rgba(0,0,0,0.3); display: flex; align-items: center; justify-content: space-between; flex-wrap: wrap; gap: 20px; z-index: 1000; position: relative; }
-        .graph-header h1 { font-size: 1.8rem; font-weight: 700; display: flex; align-items: center; gap: 12px; }
-        .graph-header .info { font-size: 0.95rem; opacity: 0.9; }
-        .legend { background: rgba(255,255,255,0.1); padding: 15px 20px; border-radius: 10px; backdrop-filter: blur(10px); display: flex; gap: 20px; flex-wrap: wrap; align-items: center; }
-        .legend-item { display: flex; align-items: center; gap: 8px; font-size: 0.85rem; }
-        .legend-node { width: 20px; height: 20px; border-radius: 50%; border: 2px solid; display: inline-block; }
-        .legend-node.box { border-radius: 4px; }
-        .legend-node.triangle { width: 0; height: 0; border-left: 10px solid transparent; border-right: 10px solid transparent; border-bottom: 18px solid; border-top: none; border-radius: 0; }
-        .legend-class { background: #4CAF50; border-color: #45a049; }
-        .legend-property { background: #81C784; border-color: #66BB6A; }
-        .legend-movie { background: #FF5252; border-color: #E53935; }
-        .legend-director { border-bottom-color: #FFC107; border-left-color: transparent; border-right-color: transparent; }
-        .legend-actor { background: #4DD0E1; border-color: #00ACC1; }
-        .legend-genre { background: #81C784; border-color: #66BB6A; }
-        .graph-container { height: calc(100vh - 120px); width: 100%; position: relative; padding: 20px; }
-        #mynetworkid { width: 100% !important; height: 100% !important; background: #1A201E !important; border-radius: 10px; }
-        .controls { position: absolute; top: 130px; right: 20px; background: rgba(255,255,255,0.1); padding: 15px; border-radius: 10px; backdrop-filter: blur(10px); z-index: 100; display: flex; flex-direction: column; gap: 10px; }
-        .control-btn { padding: 8px 16px; background: rgba(255,255,255,0.2); border: 1px solid rgba(255,255,255,0.3); color: white; border-radius: 6px; cursor: pointer; font-size: 0.9rem; transition: all 0.3s ease; }
-        .control-btn:hover { background: rgba(255,255,255,0.3); transform: translateY(-2px); }
-        @media (max-width: 768px) { .graph-header { padding: 15px 20px; } .graph-header h1 { font-size: 1.4rem; } .legend { font-size: 0.75rem; gap: 10px; } .controls { display: none; } }
-    </style>'''
+    Returns the path of the written HTML file, or the HTML itself when
+    return_html is True (nothing is written to disk in that case).
+    The file is named after a hash of the page, so a page that was already
+    written, by this or an earlier run, is reused instead of written again.
+    """
+    html_content, shown, digest = _render_html(graph, max_movies)
     
-    # Insert CSS before closing head tag
-    html_content = html_content.replace('</head>', css_addition + '</head>')
+    if return_html:
+        return html_content
     
-    # Write enhanced HTML
-    with open(out, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    out = f"graph_{digest}.html"
+    if not os.path.exists(out):
+        # Write to a temporary name first, so an interrupted write never
+        # leaves a truncated file under the name of the complete page
+        tmp_path = f"{out}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(html_content.encode('utf-8'))
+        os.replace(tmp_path, out)
     
     print(f"\n✅ Knowledge graph saved to {out}")
-    print(f"   Showing {len(movies)} movies with their relationships")
+    print(f"   Showing {shown} movies with their relationships")
     return out
+
+@lru_cache(maxsize=8)
+def _render_html(graph, max_movies):
+    """
+    Render the standalone page for visualize_ontology_graph: the app's
+    templates/graph.html with the graph data and stylesheet embedded instead
+    of fetched, so the file opens without the app running.
+    
+    Returns:
+        Tuple (HTML, number of movies shown, hex digest of the HTML)
+    """
+    net, movies = _build_network(graph, max_movies)
+    graph_data = {'nodes': net.nodes, 'edges': net.edges, 'options': net.options}
+    with open(_GRAPH_CSS, encoding='utf-8') as f:
+        inline_css = f.read()
+    html_content = _TEMPLATES.get_template('graph.html').render(graph_data=graph_data, inline_css=inline_css)
+    digest = hashlib.blake2b(html_content.encode('utf-8'), digest_size=8).hexdigest()
+    return html_content, len(movies), digest
+
+def clear_render_cache():
+    """
+    Drop cached visualization data and pages.
+    Must be called whenever the graph is modified after it was visualized.
+    """
+    get_graph_data.cache_clear()
+    _render_html.cache_clear()